@@ -0,0 +1,511 @@
+"""
+Audio capture for the pronunciation trainer. Kept free of GUI imports:
+CaptureProcess runs this file as its own child process (python
+audio_capture.py SHM CAPACITY), so the child loads only the standard
+library, profiling.py and PyAudio (once it opens the microphone), never
+the app.
+"""
+import argparse
+import json
+import math
+import os
+import queue
+import random
+import struct
+import subprocess
+import sys
+import threading
+import time
+from array import array
+from multiprocessing import shared_memory
+
+from profiling import AttemptProfiler
+
+# Capture format written into the shared ring buffer (16-bit mono PCM)
+CAPTURE_RATE = 16000
+CAPTURE_WIDTH = 2
+CAPTURE_CHUNK = 1024
+RING_SECONDS = 60  # also the longest utterance the ring can hand off
+
+# -----------------------------
+# Audio capture process
+# -----------------------------
+def _sum_squares(buf):
+    with memoryview(buf) as mv, mv.cast("h") as samples:
+        return sum(s * s for s in samples), len(samples)
+
+def pcm_rms(buf):
+    total, count = _sum_squares(buf)
+    return math.sqrt(total / count) if count else 0.0
+
+class PcmRingBuffer:
+    """
+    Single-producer PCM ring in multiprocessing.shared_memory.
+    Audio is addressed by absolute byte position (the monotonic write
+    counter), so a reader that has been lapped by the writer can tell.
+    Header: write position, capture (device) overflow count.
+    """
+    HEADER = struct.Struct("=QQ")
+    HEADER_SIZE = 64
+
+    def __init__(self, shm, capacity):
+        self.shm = shm
+        self.capacity = capacity
+        self.data = shm.buf[self.HEADER_SIZE:self.HEADER_SIZE + capacity]
+
+    @classmethod
+    def create(cls, capacity):
+        capacity -= capacity % CAPTURE_WIDTH  # keep writes sample-aligned
+        shm = shared_memory.SharedMemory(create=True, size=cls.HEADER_SIZE + capacity)
+        cls.HEADER.pack_into(shm.buf, 0, 0, 0)
+        return cls(shm, capacity)
+
+    @classmethod
+    def attach(cls, name, capacity):
+        # The creator owns the segment. An attaching subprocess has its own
+        # resource tracker, which would otherwise unlink it when it exits.
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=name)
+            if os.name == "posix":
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, capacity)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def write_pos(self):
+        return self.HEADER.unpack_from(self.shm.buf, 0)[0]
+
+    @property
+    def capture_overflows(self):
+        return self.HEADER.unpack_from(self.shm.buf, 0)[1]
+
+    def count_overflow(self):
+        pos, overflows = self.HEADER.unpack_from(self.shm.buf, 0)
+        self.HEADER.pack_into(self.shm.buf, 0, pos, overflows + 1)
+
+    def write(self, buf):
+        with memoryview(buf) as mv, mv.cast("B") as src:
+            pos, overflows = self.HEADER.unpack_from(self.shm.buf, 0)
+            n = len(src)
+            if n > self.capacity:  # only the tail can survive anyway
+                pos += n - self.capacity
+                src = src[n - self.capacity:]
+                n = self.capacity
+            off = pos % self.capacity
+            first = min(n, self.capacity - off)
+            self.data[off:off + first] = src[:first]
+            if first < n:
+                self.data[:n - first] = src[first:]
+            # Publish only after the bytes are in place
+            self.HEADER.pack_into(self.shm.buf, 0, pos + n, overflows)
+
+    def segments(self, start, end):
+        """
+        Zero-copy views of [start, end) (one, or two when it wraps).
+        Returns None if the writer has already overwritten `start`.
+        Callers must release the views before the ring is closed.
+        """
+        if start < self.write_pos - self.capacity:
+            return None
+        off, n = start % self.capacity, end - start
+        first = min(n, self.capacity - off)
+        views = [self.data[off:off + first]]
+        if first < n:
+            views.append(self.data[:n - first])
+        return views
+
+    def read(self, start, end):
+        """Copy [start, end) out of the ring, or None if it was overwritten."""
+        views = self.segments(start, end)
+        if views is None:
+            return None
+        data = b"".join(views)
+        for v in views:
+            v.release()
+        # The writer may have lapped us while we were copying
+        if start < self.write_pos - self.capacity:
+            return None
+        return data
+
+    def rms_latest(self, nbytes):
+        end = self.write_pos
+        start = max(0, end - min(nbytes, self.capacity))
+        start -= start % CAPTURE_WIDTH
+        views = self.segments(start, end) or []
+        total = count = 0
+        for v in views:
+            with v:
+                t, c = _sum_squares(v)
+            total += t
+            count += c
+        return math.sqrt(total / count) if count else 0.0
+
+    def close(self):
+        self.data.release()
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+class MicrophoneSource:
+    """
+    PyAudio callback stream. Device overflows arrive as a status flag on the
+    callback and are counted on the ring; unlike a blocking read with
+    exception_on_overflow=True, no captured chunk is thrown away.
+    """
+    def __init__(self, ring, stall_timeout=5.0):
+        self.ring = ring
+        self.stall_timeout = stall_timeout
+        self._chunks = queue.Queue()
+        self._overflows = 0  # bumped on PortAudio's thread, drained in read()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        import pyaudio
+        self._overflow_flag = pyaudio.paInputOverflow
+        self._continue = pyaudio.paContinue
+        self._pa = pyaudio.PyAudio()
+        try:
+            self._stream = self._pa.open(
+                format=self._pa.get_format_from_width(CAPTURE_WIDTH),
+                channels=1,
+                rate=CAPTURE_RATE,
+                input=True,
+                frames_per_buffer=CAPTURE_CHUNK,
+                stream_callback=self._callback,
+            )
+        except Exception:
+            self._pa.terminate()
+            raise
+        return self
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        if status & self._overflow_flag:
+            with self._lock:
+                self._overflows += 1
+        self._chunks.put(in_data)
+        return (None, self._continue)
+
+    def read(self, frames):
+        # Each callback delivers CAPTURE_CHUNK frames, the size listen_for_utterance reads
+        try:
+            data = self._chunks.get(timeout=self.stall_timeout)
+        except queue.Empty:
+            raise OSError("no audio from the input device") from None
+        with self._lock:
+            overflows, self._overflows = self._overflows, 0
+        for _ in range(overflows):
+            self.ring.count_overflow()
+        return data
+
+    def __exit__(self, *exc):
+        try:
+            self._stream.stop_stream()
+            self._stream.close()
+        finally:
+            self._pa.terminate()
+
+class SyntheticSource:
+    """
+    Microphone stand-in for running without hardware: low background noise,
+    a sine-tone "utterance" of `speech_seconds` after `lead_seconds`, then
+    noise again. Paced in real time unless realtime=False. The noise is
+    seeded, so two sources with the same arguments produce the same bytes.
+    """
+    def __init__(self, lead_seconds=1.0, speech_seconds=1.5, freq=220.0,
+                 amplitude=8000, noise=60, realtime=True, seed=0):
+        self.lead_seconds = lead_seconds
+        self.speech_seconds = speech_seconds
+        self.freq = freq
+        self.amplitude = amplitude
+        self.noise = noise
+        self.realtime = realtime
+        self._rng = random.Random(seed)
+        self._n = 0
+
+    def __enter__(self):
+        return self
+
+    def read(self, frames):
+        out = array("h")
+        speech_end = self.lead_seconds + self.speech_seconds
+        for _ in range(frames):
+            t = self._n / CAPTURE_RATE
+            s = self._rng.gauss(0.0, self.noise)
+            if self.lead_seconds <= t < speech_end:
+                s += self.amplitude * math.sin(2 * math.pi * self.freq * t)
+            out.append(int(max(-32768, min(32767, s))))
+            self._n += 1
+        if self.realtime:
+            time.sleep(frames / CAPTURE_RATE)
+        return out.tobytes()
+
+    def __exit__(self, *exc):
+        pass
+
+def listen_for_utterance(source, ring, pause_threshold, energy_threshold=300,
+                         ambient_duration=0.5, phrase_threshold=0.3, non_speaking_duration=0.5):
+    """
+    Energy endpointing modelled on speech_recognition.Recognizer.listen:
+    calibrate on ambient noise, wait for speech, stop after pause_threshold
+    seconds of silence. Every chunk goes into the ring; returns the
+    (start, end) byte span of the utterance.
+    """
+    chunk_bytes = CAPTURE_CHUNK * CAPTURE_WIDTH
+    seconds_per_chunk = CAPTURE_CHUNK / CAPTURE_RATE
+    damping = 0.15 ** seconds_per_chunk
+    pause_chunks = int(math.ceil(pause_threshold / seconds_per_chunk))
+    phrase_chunks = int(math.ceil(phrase_threshold / seconds_per_chunk))
+    non_speaking_chunks = int(math.ceil(non_speaking_duration / seconds_per_chunk))
+
+    def read_chunk():
+        data = source.read(CAPTURE_CHUNK)
+        ring.write(data)
+        return data, pcm_rms(data)
+
+    threshold = energy_threshold
+    elapsed = 0.0
+    while elapsed < ambient_duration:
+        _, energy = read_chunk()
+        threshold = threshold * damping + energy * 1.5 * (1 - damping)
+        elapsed += seconds_per_chunk
+
+    listen_start = ring.write_pos
+    while True:
+        # Wait for speech, keeping non_speaking_duration of lead-in
+        while True:
+            data, energy = read_chunk()
+            if not data or energy > threshold:
+                break
+            threshold = threshold * damping + energy * 1.5 * (1 - damping)
+        start = max(listen_start, ring.write_pos - non_speaking_chunks * chunk_bytes)
+
+        pause_count = phrase_count = 0
+        while data:
+            # Stop before the utterance outgrows the ring and its head is lost
+            if ring.write_pos - start + chunk_bytes > ring.capacity:
+                break
+            data, energy = read_chunk()
+            phrase_count += 1
+            pause_count = 0 if energy > threshold else pause_count + 1
+            if pause_count > pause_chunks:
+                break
+        if phrase_count - pause_count >= phrase_chunks or not data:
+            break
+
+    end = ring.write_pos - max(0, pause_count - non_speaking_chunks) * chunk_bytes
+    return start, end
+
+def capture_process_main(shm_name, capacity, commands, events, synthetic=False):
+    """
+    Child process loop: runs capture + endpointing off the UI's GIL.
+    Commands are JSON lines read from `commands`: ["listen", pause_threshold]
+    or ["profile", label, stamp, directory], which profiles the next listen
+    until its event is sent; EOF means exit. Events are JSON lines written
+    to `events`: ["utterance", start, end] or ["err", message].
+    """
+    def emit(*event):
+        events.write(json.dumps(event) + "\n")
+        events.flush()
+
+    ring = PcmRingBuffer.attach(shm_name, capacity)
+    profiler = profile_dir = None
+    try:
+        for line in iter(commands.readline, ""):
+            cmd = json.loads(line)
+            if cmd[0] == "profile":
+                profiler = AttemptProfiler(cmd[1], stamp=cmd[2]).start()
+                profile_dir = cmd[3]
+                continue
+            if cmd[0] != "listen":
+                continue
+            try:
+                source = SyntheticSource() if synthetic else MicrophoneSource(ring)
+                with source:
+                    start, end = listen_for_utterance(source, ring, cmd[1])
+            except Exception as e:
+                event = ("err", f"Mic/recording error: {e}")
+            else:
+                event = ("utterance", start, end)
+            if profiler is not None:
+                try:
+                    profiler.stop_and_dump(profile_dir)
+                except OSError as e:
+                    print(f"Capture profile not saved: {e}", file=sys.stderr)
+                profiler = None
+            emit(*event)
+    finally:
+        ring.close()
+
+class CaptureProcess:
+    """UI-side handle: owns the shared ring and the child capture process."""
+    def __init__(self, synthetic=False, seconds=RING_SECONDS):
+        self.ring = PcmRingBuffer.create(int(seconds * CAPTURE_RATE) * CAPTURE_WIDTH)
+        self.events = queue.Queue()
+        self.reader_overruns = 0
+        self._last_level_pos = 0
+        self._last_level = 0.0
+        self._last_write_time = 0.0
+        # A plain subprocess running this file: multiprocessing's spawn would
+        # re-run the app's main script (Tk, speech libraries) in the child
+        args = [sys.executable, os.path.abspath(__file__), self.ring.name, str(self.ring.capacity)]
+        if synthetic:
+            args.append("--synthetic")
+        try:
+            self.process = subprocess.Popen(
+                args,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                text=True,
+                encoding="utf-8",
+                bufsize=1,
+                creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+            )
+        except Exception:
+            self.ring.close()
+            self.ring.unlink()
+            raise
+        self._reader = threading.Thread(target=self._read_events, name="capture-events", daemon=True)
+        self._reader.start()
+
+    def _read_events(self):
+        for line in self.process.stdout:
+            self.events.put(tuple(json.loads(line)))
+
+    def _send(self, *cmd):
+        try:
+            self.process.stdin.write(json.dumps(cmd) + "\n")
+            self.process.stdin.flush()
+        except (OSError, ValueError):
+            self.events.put(("err", "Mic/recording error: capture process is not running"))
+
+    def listen(self, pause_threshold):
+        self._send("listen", pause_threshold)
+
+    def profile(self, label, stamp, directory):
+        """Have the child profile its next listen into directory."""
+        self._send("profile", label, stamp, os.path.abspath(directory))
+
+    def is_alive(self):
+        """False once the child has exited and all of its events are queued."""
+        return self.process.poll() is None or self._reader.is_alive()
+
+    def poll_event(self):
+        try:
+            return self.events.get_nowait()
+        except queue.Empty:
+            return None
+
+    def take_pcm(self, start, end):
+        """Copy an utterance's PCM out of the ring (None, counted, on overrun)."""
+        data = self.ring.read(start, end)
+        if data is None:
+            self.reader_overruns += 1
+        return data
+
+    def level(self, window=0.05, idle_timeout=0.2):
+        """
+        Input level 0..1 (-60..0 dBFS) over the latest window, read in place.
+        Chunks land every ~64 ms, so between writes the last value is held;
+        it only drops to 0 after idle_timeout seconds without a write.
+        """
+        pos = self.ring.write_pos
+        now = time.monotonic()
+        if pos == self._last_level_pos:
+            if now - self._last_write_time > idle_timeout:
+                self._last_level = 0.0  # not capturing
+            return self._last_level
+        self._last_level_pos = pos
+        self._last_write_time = now
+        rms = self.ring.rms_latest(int(window * CAPTURE_RATE) * CAPTURE_WIDTH)
+        if rms <= 0:
+            self._last_level = 0.0
+        else:
+            dbfs = 20 * math.log10(rms / 32768.0)
+            self._last_level = max(0.0, min(1.0, (dbfs + 60.0) / 60.0))
+        return self._last_level
+
+    def shutdown(self):
+        try:
+            try:
+                self.process.stdin.close()  # EOF: the child exits when idle
+            except OSError:
+                pass
+            try:
+                self.process.wait(timeout=1.0)
+            except subprocess.TimeoutExpired:
+                self.process.kill()  # may be blocked mid-listen
+                self.process.wait(timeout=1.0)
+        finally:
+            self.ring.close()
+            self.ring.unlink()
+
+def verify_synthetic_utterance(start, end, pcm, **source_kwargs):
+    """
+    Problems (empty if none) with an utterance captured into a fresh ring
+    from SyntheticSource(**source_kwargs): the span must cover the whole
+    tone, and the bytes must equal what the source produced there.
+    """
+    if pcm is None:
+        return ["utterance overwritten before it was read"]
+    bytes_per_second = CAPTURE_RATE * CAPTURE_WIDTH
+    reference = SyntheticSource(realtime=False, **source_kwargs)
+    tone_start = int(reference.lead_seconds * bytes_per_second)
+    tone_end = int((reference.lead_seconds + reference.speech_seconds) * bytes_per_second)
+    problems = []
+    if start > tone_start or end < tone_end:
+        problems.append(f"span {start}..{end} does not cover the tone at {tone_start}..{tone_end}")
+    if pcm != reference.read(end // CAPTURE_WIDTH)[start:end]:
+        problems.append("captured bytes differ from what the synthetic source produced")
+    return problems
+
+def run_capture_selftest(pause_threshold=2.5):
+    """
+    Headless harness: drive the real capture process with SyntheticSource
+    and check the utterance comes back out of the ring intact.
+    """
+    capture = CaptureProcess(synthetic=True)
+    try:
+        capture.listen(pause_threshold)
+        deadline = time.monotonic() + 30
+        event = None
+        while event is None and time.monotonic() < deadline:
+            event = capture.poll_event()
+            time.sleep(0.05)
+        if event is None or event[0] != "utterance":
+            print(f"FAIL: {event or 'no event within 30s'}")
+            return 1
+        _, start, end = event
+        pcm = capture.take_pcm(start, end)
+        seconds = (end - start) / (CAPTURE_RATE * CAPTURE_WIDTH)
+        print(f"utterance: bytes {start}..{end} ({seconds:.2f}s), "
+              f"capture overflows={capture.ring.capture_overflows}, "
+              f"reader overruns={capture.reader_overruns}")
+        problems = verify_synthetic_utterance(start, end, pcm)
+        for problem in problems:
+            print(f"FAIL: {problem}")
+        if problems:
+            return 1
+        print("OK")
+        return 0
+    finally:
+        capture.shutdown()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Capture child process (started by CaptureProcess)")
+    parser.add_argument("shm_name")
+    parser.add_argument("capacity", type=int)
+    parser.add_argument("--synthetic", action="store_true")
+    args = parser.parse_args(argv)
+    # stdout carries events; keep any stray prints off it
+    events, sys.stdout = sys.stdout, sys.stderr
+    capture_process_main(args.shm_name, args.capacity, sys.stdin, events, args.synthetic)
+
+if __name__ == "__main__":
+    main()
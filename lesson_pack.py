@@ -0,0 +1,224 @@
+"""
+Text analysis (rhythm, intonation, IPA) and precompiled lesson packs.
+No GUI imports: eng_to_ipa and pyttsx3 are loaded only when IPA or TTS
+audio is actually produced, so packs can be built and tested headlessly.
+"""
+import io
+import json
+import mmap
+import os
+import re
+import struct
+import tempfile
+import wave
+
+CONTENT_WORD_POS_GUESS = {
+    # Rough heuristic lists; we’ll treat these as FUNCTION words (lowercase).
+    "function": set("""
+a an the and but or so for nor of at by from with without within into onto to up down over under on in out as is am are was were be been being do does did have has had will would should could can may might must than then there here this that these those not no yes if also very just only maybe perhaps really about across after again against all almost already although always among around because before below between both each either enough ever every few fewer first former further
+""".split())
+}
+
+AUX_STARTERS = {
+    "is","are","am","was","were",
+    "do","does","did",
+    "have","has","had",
+    "can","could","will","would","shall","should","may","might","must"
+}
+
+# -----------------------------
+# Text analysis
+# -----------------------------
+def split_into_sentences(text: str):
+    # Preserve ending punctuation to help intonation; simple robust split
+    pieces = re.split(r'([.?!])', text)
+    sentences = []
+    for i in range(0, len(pieces), 2):
+        if i < len(pieces):
+            core = pieces[i].strip()
+            end = pieces[i+1] if i+1 < len(pieces) else ''
+            s = (core + end).strip()
+            if s:
+                sentences.append(s)
+    return sentences
+
+def is_yes_no_question(sentence: str):
+    s = sentence.strip()
+    if s.endswith('?'):
+        return True  # simplest case
+    # If no explicit '?', infer from auxiliary-initial
+    words = re.findall(r"[A-Za-z']+", s.lower())
+    return bool(words and words[0] in AUX_STARTERS)
+
+def rhythm_transform(sentence: str):
+    """
+    Convert content words to UPPERCASE (stress); function words remain lowercase.
+    Very lightweight heuristic: if a word is in FUNCTION list -> lowercase,
+    else uppercase (keeping apostrophes).
+    """
+    out_tokens = []
+    for token in re.findall(r"[A-Za-z']+|[^A-Za-z'\s]+|\s+", sentence, flags=re.UNICODE):
+        if re.fullmatch(r"[A-Za-z']+", token):
+            wlow = token.lower()
+            if wlow in CONTENT_WORD_POS_GUESS["function"]:
+                out_tokens.append(wlow)  # function words lowered
+            else:
+                out_tokens.append(token.upper())
+        else:
+            out_tokens.append(token)
+    return "".join(out_tokens)
+
+def mk_arrow_and_color(is_yn):
+    # Return arrow and a color for it
+    # Rising for Yes/No; falling otherwise
+    return ("↗", "#5AC8FA") if is_yn else ("↘", "#FFCC00")
+
+def rhythm_runs(text):
+    """
+    Target rhythm & intonation as (text, tags) runs for the rich text box:
+    content words bold, function words dimmed, one arrow per sentence.
+    """
+    runs = []
+    sentences = split_into_sentences(text)
+    for idx, s in enumerate(sentences):
+        stressed = rhythm_transform(s)
+        yn = is_yes_no_question(s)
+        arrow, _ = mk_arrow_and_color(yn)
+
+        # Tokenize to separate words and spaces/punct
+        for t in re.findall(r"[A-Za-z']+|[^A-Za-z'\s]+|\s+", stressed):
+            if re.fullmatch(r"[A-Za-z']+", t):
+                if t.isupper():
+                    runs.append((t, ("bold", "content")))
+                else:
+                    # function words (lowercase)
+                    runs.append((t, ("function",)))
+            else:
+                runs.append((t, ()))
+
+        runs.append(("  " + arrow, ("arrow_rise" if yn else "arrow_fall",)))
+
+        # Newline between sentences
+        if idx < len(sentences) - 1:
+            runs.append(("\n", ()))
+    return runs
+
+def safe_ipa(text):
+    try:
+        import eng_to_ipa as ipa
+        return ipa.convert(text)
+    except Exception:
+        return "(IPA unavailable)"
+
+# -----------------------------
+# Lesson packs
+# -----------------------------
+def read_lesson(path):
+    """Lesson file: one drill sentence per line; blank lines and '#' comments skipped."""
+    with open(path, encoding="utf-8") as f:
+        lines = (line.strip() for line in f)
+        return [line for line in lines if line and not line.startswith("#")]
+
+def render_tts_wav(text):
+    """Render slow TTS for `text` to WAV bytes, or None if the engine can't produce WAV."""
+    fd, path = tempfile.mkstemp(suffix=".wav")
+    os.close(fd)
+    try:
+        import pyttsx3
+        # Fresh engine per sentence, same as live playback
+        engine = pyttsx3.init()
+        engine.setProperty('rate', 140)
+        engine.save_to_file(text, path)
+        engine.runAndWait()
+        engine.stop()
+        with open(path, "rb") as f:
+            data = f.read()
+        with wave.open(io.BytesIO(data)) as w:
+            w.getparams()  # some drivers (macOS) write AIFF; only keep real WAV
+        return data
+    except Exception:
+        return None
+    finally:
+        os.remove(path)
+
+class LessonPack:
+    """
+    Precompiled lesson: per sentence, the right-panel analysis (IPA, rhythm
+    runs with their text tags, yes/no arrow) as JSON plus pre-rendered TTS
+    audio, in one indexed file that is memory-mapped read-only, so moving
+    to another drill sentence is a lookup.
+
+    Layout (little-endian): header (magic, count, index offset), the
+    blobs, then one index entry per sentence (meta offset/length, audio
+    offset/length; audio length 0 when no WAV could be rendered).
+    """
+    MAGIC = b"S2TPACK1"
+    HEADER = struct.Struct("<8sIQ")
+    ENTRY = struct.Struct("<QIQI")
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self._mm) < self.HEADER.size:
+                raise ValueError(f"{path} is too short to be a lesson pack")
+            magic, self.count, self._index = self.HEADER.unpack_from(self._mm, 0)
+            if magic != self.MAGIC:
+                raise ValueError(f"{path} is not a lesson pack")
+            if self.count == 0:
+                raise ValueError(f"{path} contains no sentences")
+            if not self.HEADER.size <= self._index <= len(self._mm) - self.count * self.ENTRY.size:
+                raise ValueError(f"{path} is truncated: index does not fit in the file")
+        except Exception:
+            self._mm.close()
+            raise
+
+    def __len__(self):
+        return self.count
+
+    def entry(self, i):
+        """Metadata dict for sentence i, with "audio" as WAV bytes or None."""
+        if not 0 <= i < self.count:
+            raise IndexError(f"lesson pack entry {i} out of range (0..{self.count - 1})")
+        meta_off, meta_len, audio_off, audio_len = self.ENTRY.unpack_from(
+            self._mm, self._index + i * self.ENTRY.size
+        )
+        meta = json.loads(self._mm[meta_off:meta_off + meta_len])
+        meta["runs"] = [(text, tuple(tags)) for text, tags in meta["runs"]]
+        meta["audio"] = self._mm[audio_off:audio_off + audio_len] if audio_len else None
+        return meta
+
+    def close(self):
+        self._mm.close()
+
+def compile_lesson_pack(lesson_path, pack_path, audio=True):
+    """Compile a lesson file into a LessonPack at pack_path; returns (sentences, with_audio)."""
+    sentences = read_lesson(lesson_path)
+    if not sentences:
+        raise ValueError(f"{lesson_path} has no sentences (only blank or '#' lines)")
+    entries = []
+    rendered = 0
+    with open(pack_path, "wb") as f:
+        f.write(LessonPack.HEADER.pack(LessonPack.MAGIC, 0, 0))
+        for sentence in sentences:
+            meta = json.dumps({
+                "text": sentence,
+                "ipa": safe_ipa(sentence),
+                "runs": rhythm_runs(sentence),
+                "yes_no": is_yes_no_question(sentence),
+            }, ensure_ascii=False).encode("utf-8")
+            wav = render_tts_wav(sentence) if audio else None
+            meta_off = f.tell()
+            f.write(meta)
+            audio_off = f.tell()
+            if wav:
+                f.write(wav)
+                rendered += 1
+            entries.append((meta_off, len(meta), audio_off, len(wav) if wav else 0))
+        index = f.tell()
+        for e in entries:
+            f.write(LessonPack.ENTRY.pack(*e))
+        f.seek(0)
+        f.write(LessonPack.HEADER.pack(LessonPack.MAGIC, len(entries), index))
+    return len(sentences), rendered
@@ -0,0 +1,60 @@
+"""
+Per-attempt sampling profiler. Kept free of GUI imports so the capture
+child process (audio_capture.py) can profile itself alongside the app.
+"""
+import os
+import sys
+import threading
+import time
+
+PROFILE_DIR = "profiles"
+
+class AttemptProfiler:
+    """
+    Sampling profiler for a single attempt. A daemon thread snapshots every
+    Python thread's stack (sys._current_frames) and aggregates them as
+    collapsed stacks, "thread;outer;...;inner count" per line, which
+    flamegraph.pl and speedscope read directly. It only exists while a
+    profile is being taken, so there is no cost when profiling is off.
+    """
+    def __init__(self, label, interval=0.005, stamp=None):
+        self.label = label
+        self.interval = interval
+        self.counts = {}
+        self.samples = 0
+        # Pass the parent's stamp so profiles of one attempt sort together
+        self.stamp = stamp or time.strftime("%Y%m%d-%H%M%S")
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                key = ";".join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+            self.samples += 1
+
+    def stop_and_dump(self, directory=PROFILE_DIR):
+        """Stop sampling and write profile-<timestamp>-<label>.collapsed; returns the path."""
+        self._stop.set()
+        self._thread.join()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"profile-{self.stamp}-{self.label}.collapsed")
+        with open(path, "w", encoding="utf-8") as f:
+            for key, count in sorted(self.counts.items(), key=lambda kv: -kv[1]):
+                f.write(f"{key} {count}\n")
+        return path
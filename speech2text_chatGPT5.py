@@ -1,13 +1,20 @@
+import argparse
+import collections
+import io
+import os
+import sys
 import threading
 import queue
-import re
 import time
+import wave
 import tkinter as tk
 from tkinter import font as tkfont
 import customtkinter as ctk
 import speech_recognition as sr
 import pyttsx3
-import eng_to_ipa as ipa
+from audio_capture import CAPTURE_CHUNK, CAPTURE_RATE, CAPTURE_WIDTH, CaptureProcess, run_capture_selftest
+from lesson_pack import LessonPack, compile_lesson_pack, rhythm_runs, safe_ipa
+from profiling import PROFILE_DIR, AttemptProfiler
 
 # -----------------------------
 # App Config
@@ -16,62 +23,17 @@ ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("blue")
 
 MIN_W, MIN_H = 1000, 800
-CONTENT_WORD_POS_GUESS = {
-    # Rough heuristic lists; we’ll treat these as FUNCTION words (lowercase).
-    "function": set("""
-a an the and but or so for nor of at by from with without within into onto to up down over under on in out as is am are was were be been being do does did have has had will would should could can may might must than then there here this that these those not no yes if also very just only maybe perhaps really about across after again against all almost already although always among around because before below between both each either enough ever every few fewer first former further
-""".split())
-}
-
-AUX_STARTERS = {
-    "is","are","am","was","were",
-    "do","does","did",
-    "have","has","had",
-    "can","could","will","would","shall","should","may","might","must"
-}
+
+# Pipelined attempts: captured-but-unapplied utterances allowed at once,
+# and how many of them may be in recognition concurrently
+MAX_PENDING_ATTEMPTS = 4
+RECOGNIZE_WORKERS = 3
+# Results apply in order, so a stalled request must fail rather than hold the queue
+RECOGNIZE_TIMEOUT = 15  # seconds
 
 # -----------------------------
 # Helper functions
 # -----------------------------
-def split_into_sentences(text: str):
-    # Preserve ending punctuation to help intonation; simple robust split
-    pieces = re.split(r'([.?!])', text)
-    sentences = []
-    for i in range(0, len(pieces), 2):
-        if i < len(pieces):
-            core = pieces[i].strip()
-            end = pieces[i+1] if i+1 < len(pieces) else ''
-            s = (core + end).strip()
-            if s:
-                sentences.append(s)
-    return sentences
-
-def is_yes_no_question(sentence: str):
-    s = sentence.strip()
-    if s.endswith('?'):
-        return True  # simplest case
-    # If no explicit '?', infer from auxiliary-initial
-    words = re.findall(r"[A-Za-z']+", s.lower())
-    return bool(words and words[0] in AUX_STARTERS)
-
-def rhythm_transform(sentence: str):
-    """
-    Convert content words to UPPERCASE (stress); function words remain lowercase.
-    Very lightweight heuristic: if a word is in FUNCTION list -> lowercase,
-    else uppercase (keeping apostrophes).
-    """
-    out_tokens = []
-    for token in re.findall(r"[A-Za-z']+|[^A-Za-z'\s]+|\s+", sentence, flags=re.UNICODE):
-        if re.fullmatch(r"[A-Za-z']+", token):
-            wlow = token.lower()
-            if wlow in CONTENT_WORD_POS_GUESS["function"]:
-                out_tokens.append(wlow)  # function words lowered
-            else:
-                out_tokens.append(token.upper())
-        else:
-            out_tokens.append(token)
-    return "".join(out_tokens)
-
 def compute_confidence_from_google_show_all(show_all):
     """
     Google Web Speech (via SpeechRecognition) returns a dict when show_all=True.
@@ -94,11 +56,6 @@ def compute_confidence_from_google_show_all(show_all):
         pass
     return None
 
-def mk_arrow_and_color(is_yn):
-    # Return arrow and a color for it
-    # Rising for Yes/No; falling otherwise
-    return ("↗", "#5AC8FA") if is_yn else ("↘", "#FFCC00")
-
 def confidence_to_color_and_value(conf):
     # Map to color & normalized 0..1 for CTkProgressBar
     if conf is None:
@@ -112,17 +69,37 @@ def confidence_to_color_and_value(conf):
         color = "#34C759"  # green
     return (color, max(0.0, min(1.0, conf)), f"{pct:.1f}%")
 
-def safe_ipa(text):
-    try:
-        return ipa.convert(text)
-    except Exception:
-        return "(IPA unavailable)"
+# -----------------------------
+# Playback
+# -----------------------------
+def play_wav(data):
+    """Play WAV bytes through PyAudio (blocking; call from a worker thread)."""
+    import pyaudio
+    with wave.open(io.BytesIO(data)) as w:
+        pa = pyaudio.PyAudio()
+        try:
+            stream = pa.open(
+                format=pa.get_format_from_width(w.getsampwidth()),
+                channels=w.getnchannels(),
+                rate=w.getframerate(),
+                output=True,
+            )
+            try:
+                chunk = w.readframes(CAPTURE_CHUNK)
+                while chunk:
+                    stream.write(chunk)
+                    chunk = w.readframes(CAPTURE_CHUNK)
+            finally:
+                stream.stop_stream()
+                stream.close()
+        finally:
+            pa.terminate()
 
 # -----------------------------
 # App Class
 # -----------------------------
 class PronunciationTrainerApp(ctk.CTk):
-    def __init__(self):
+    def __init__(self, synthetic=False, profile=False, lesson_pack=None):
         super().__init__()
 
         self.title("English Pronunciation Trainer")
@@ -136,11 +113,36 @@ class PronunciationTrainerApp(ctk.CTk):
         # State
         self.recognizer = sr.Recognizer()
         self.recognizer.pause_threshold = 2.5  # crucial per spec
+        self.recognizer.operation_timeout = RECOGNIZE_TIMEOUT
         self.audio_data = None
         self.transcript = ""
         self.confidence = None
-        self.recording_thread = None
         self.recording_queue = queue.Queue()
+        # Attempts are numbered at the record click; `pending` holds every
+        # attempt not yet applied to the UI (None while still in flight), in
+        # order, so results land in attempt order whatever order ASR finishes
+        self.next_attempt = 1
+        self.listening_attempt = None
+        self.pending = collections.OrderedDict()
+        self.speaking = False
+        # Daemon workers, so closing the window never waits on a slow request
+        self.recognize_jobs = queue.Queue()
+        for n in range(RECOGNIZE_WORKERS):
+            threading.Thread(target=self._recognize_worker, name=f"recognize_{n}", daemon=True).start()
+        # Capture + endpointing live in a child process (see CaptureProcess)
+        self.synthetic = synthetic
+        self.capture = CaptureProcess(synthetic=synthetic)
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+        # Profiling: armed by --profile or F9, covers the next attempt only
+        self.profile_armed = profile
+        self.profiler = None
+        self.profile_attempt = None
+        self.bind("<F9>", self.toggle_profile_armed)
+        # Drill mode: a memory-mapped LessonPack supplies the target analysis
+        self.pack = lesson_pack
+        self.drill_index = 0
+        self.attempt_drills = {}  # attempt id -> drill index it was recorded against
+        self.drill = None
 
         # Left Panel (Controls + Transcript)
         self.left = ctk.CTkFrame(self)
@@ -174,6 +176,17 @@ class PronunciationTrainerApp(ctk.CTk):
         self.status_lbl = ctk.CTkLabel(self.left, text="Ready.", anchor="w")
         self.status_lbl.grid(row=3, column=0, sticky="ew", pady=(8,0))
 
+        # Input level meter, read straight from the shared capture ring
+        level_frame = ctk.CTkFrame(self.left)
+        level_frame.grid(row=4, column=0, sticky="ew", pady=(8,0))
+        level_frame.grid_columnconfigure(1, weight=1)
+        ctk.CTkLabel(level_frame, text="Input Level").grid(row=0, column=0, sticky="w", padx=(6, 8))
+        self.level_bar = ctk.CTkProgressBar(level_frame)
+        self.level_bar.grid(row=0, column=1, sticky="ew", padx=(0, 6))
+        self.level_bar.set(0.0)
+        self.overrun_lbl = ctk.CTkLabel(level_frame, text="Overruns: capture 0 · buffer 0", anchor="w")
+        self.overrun_lbl.grid(row=1, column=0, columnspan=2, sticky="w", padx=6)
+
         # Right Panel (Analysis)
         self.right = ctk.CTkFrame(self)
         self.right.grid(row=0, column=1, sticky="nsew", padx=16, pady=16)
@@ -207,6 +220,16 @@ class PronunciationTrainerApp(ctk.CTk):
         self.ipa_val.insert("1.0", "(IPA will appear here)")
         self.ipa_val.configure(state="disabled")
 
+        # Drill sentence (only with a lesson pack)
+        if self.pack is not None:
+            drill_frame = ctk.CTkFrame(self.right)
+            drill_frame.grid(row=3, column=0, sticky="ew", pady=(8, 8))
+            drill_frame.grid_columnconfigure(0, weight=1)
+            self.drill_lbl = ctk.CTkLabel(drill_frame, text="", anchor="w", justify="left", wraplength=380)
+            self.drill_lbl.grid(row=0, column=0, sticky="ew", padx=6)
+            self.next_btn = ctk.CTkButton(drill_frame, text="Next ▶", width=90, command=self.handle_next_drill)
+            self.next_btn.grid(row=0, column=1, padx=6, pady=6)
+
         # Rhythm & Intonation (tk.Text for rich tagging)
         r_frame = ctk.CTkFrame(self.right)
         r_frame.grid(row=5, column=0, sticky="nsew", pady=(8, 0))
@@ -239,40 +262,68 @@ class PronunciationTrainerApp(ctk.CTk):
         self.rhythm_text.tag_configure("content", foreground="#FFFFFF")
         self.rhythm_text.tag_configure("function", foreground="#D0D0D0")
 
+        if self.pack is not None:
+            self._show_drill(0)
+
         # Polling queue for background thread results
         self.after(100, self._poll_recording_queue)
+        self.after(50, self._poll_level)
 
     # -------------------------
     # UI Actions
     # -------------------------
     def handle_start_record(self):
-        if self.recording_thread and self.recording_thread.is_alive():
+        if not self._can_record():
             return
-        self.status_lbl.configure(text="Listening… (pause for 2.5s to stop)")
-        self.record_btn.configure(state="disabled")
-        self.play_btn.configure(state="disabled")
-        self.recording_thread = threading.Thread(target=self._record_and_transcribe, daemon=True)
-        self.recording_thread.start()
+        attempt_id = self.next_attempt
+        self.next_attempt += 1
+        self.listening_attempt = attempt_id
+        self.pending[attempt_id] = None
+        if self.pack is not None:
+            self.attempt_drills[attempt_id] = self.drill_index
+        self.status_lbl.configure(text=f"Listening… attempt #{attempt_id} (pause for 2.5s to stop)")
+        self._update_controls()
+        self._maybe_start_profile("record", attempt_id)
+        self.capture.listen(self.recognizer.pause_threshold)
 
     def handle_playback(self):
-        if not self.transcript:
+        # In drill mode playback is the target sentence, pre-rendered if possible
+        text = self.drill["text"] if self.drill else self.transcript
+        if not text:
             return
+        wav = self.drill["audio"] if self.drill else None
         self.status_lbl.configure(text="Playing back slowly…")
-        self.play_btn.configure(state="disabled")
-        self.update_idletasks()
+        self.speaking = True
+        self._update_controls()
+        self._maybe_start_profile("playback")
+        threading.Thread(target=self._speak, args=(text, wav), name="tts", daemon=True).start()
+
+    def handle_next_drill(self):
+        self._show_drill((self.drill_index + 1) % len(self.pack))
+
+    def _show_drill(self, index):
+        self.drill_index = index
+        self.drill = self.pack.entry(index)
+        self.drill_lbl.configure(text=f"Drill {index + 1}/{len(self.pack)}: {self.drill['text']}")
+        self._set_ipa_text(self.drill["ipa"])
+        self._set_rhythm_runs(self.drill["runs"])
+        self._update_controls()
+
+    def _speak(self, text, wav=None):
         try:
-            # IMPORTANT: Re-initialize pyttsx3 each time
-            engine = pyttsx3.init()
-            engine.setProperty('rate', 140)
-            engine.say(self.transcript)
-            engine.runAndWait()
-            engine.stop()
+            if wav is not None:
+                play_wav(wav)
+            else:
+                # IMPORTANT: Re-initialize pyttsx3 each time
+                engine = pyttsx3.init()
+                engine.setProperty('rate', 140)
+                engine.say(text)
+                engine.runAndWait()
+                engine.stop()
         except Exception as e:
-            self.status_lbl.configure(text=f"TTS error: {e}")
+            self.recording_queue.put(("tts", f"TTS error: {e}", None))
         else:
-            self.status_lbl.configure(text="Playback complete.")
-        finally:
-            self.play_btn.configure(state="normal")
+            self.recording_queue.put(("tts", "Playback complete.", None))
 
     def clear_all(self):
         self.transcript = ""
@@ -283,73 +334,207 @@ class PronunciationTrainerApp(ctk.CTk):
         self._set_ipa_text("(cleared)")
         self._set_rhythm_text("(cleared)")
         self.status_lbl.configure(text="Cleared.")
-        self.play_btn.configure(state="disabled")
+        self._update_controls()
+        if self.pack is not None:
+            self._show_drill(self.drill_index)
 
     # -------------------------
     # Recording & ASR
     # -------------------------
-    def _record_and_transcribe(self):
+    def _can_record(self):
+        return (self.listening_attempt is None
+                and not self.speaking
+                and len(self.pending) < MAX_PENDING_ATTEMPTS)
+
+    def _update_controls(self):
+        idle = self.listening_attempt is None and not self.speaking
+        self.record_btn.configure(state="normal" if self._can_record() else "disabled")
+        self.play_btn.configure(state="normal" if idle and (self.transcript or self.drill) else "disabled")
+
+    def _on_utterance(self, start, end):
+        # Copy out of the ring now, so recognition latency can't cause an overrun
+        attempt_id, self.listening_attempt = self.listening_attempt, None
+        pcm = self.capture.take_pcm(start, end)
+        if pcm is None:
+            self._attempt_done(attempt_id, ("err", "Capture buffer overrun: recording was overwritten.", None))
+            return
+        audio = sr.AudioData(pcm, CAPTURE_RATE, CAPTURE_WIDTH)
+        self.audio_data = audio
+        self.recognize_jobs.put((attempt_id, audio))
+        in_flight = sum(1 for r in self.pending.values() if r is None)
+        self.status_lbl.configure(text=f"Recognizing attempt #{attempt_id} ({in_flight} in flight) — record again any time.")
+        self._update_controls()
+
+    def _recognize_worker(self):
+        # Results go back through recording_queue, picked up by _poll_recording_queue
+        while True:
+            job = self.recognize_jobs.get()
+            if job is None:
+                return
+            attempt_id, audio = job
+            self.recording_queue.put(("asr", attempt_id, self._transcribe(audio)))
+
+    def _attempt_done(self, attempt_id, result):
+        self.pending[attempt_id] = result
+        while self.pending:
+            attempt_id, result = next(iter(self.pending.items()))
+            if result is None:
+                break  # an earlier attempt is still in flight
+            del self.pending[attempt_id]
+            self._apply_result(attempt_id, result)
+        self._update_controls()
+
+    def _apply_result(self, attempt_id, result):
+        kind, text, confidence = result
+        drill_index = self.attempt_drills.pop(attempt_id, None)
+        if kind == "ok":
+            self._on_transcription_ready(text, confidence, attempt_id, drill_index)
+        else:
+            self.status_lbl.configure(text=f"{self._attempt_label(attempt_id, drill_index)}: {text}")
+            self._finish_profile("record", attempt_id)
+
+    def _attempt_label(self, attempt_id, drill_index):
+        # Attempts can outlive a Next click: name the sentence they were for
+        if drill_index is None:
+            return f"Attempt #{attempt_id}"
+        if drill_index == self.drill_index:
+            return f"Attempt #{attempt_id} (drill {drill_index + 1})"
+        return f"Attempt #{attempt_id} (drill {drill_index + 1}: “{self.pack.entry(drill_index)['text']}”)"
+
+    def _transcribe(self, audio):
+        rec = self.recognizer
         try:
-            rec = self.recognizer
-            with sr.Microphone() as source:
-                # Slight ambient calibration
-                try:
-                    rec.adjust_for_ambient_noise(source, duration=0.5)
-                except Exception:
-                    pass
-                audio = rec.listen(source, phrase_time_limit=None)  # will stop on pause_threshold
-            self.audio_data = audio
-
-            try:
-                # get both transcript and show_all for confidence
-                show_all = rec.recognize_google(audio, language="en-US", show_all=True)
-                # Best transcript
-                transcript = ""
-                if isinstance(show_all, dict) and show_all.get("alternative"):
-                    transcript = show_all["alternative"][0].get("transcript", "").strip()
-                if not transcript:
-                    transcript = rec.recognize_google(audio, language="en-US").strip()
-
-                confidence = compute_confidence_from_google_show_all(show_all)
-
-                self.recording_queue.put(("ok", transcript, confidence))
-            except sr.UnknownValueError:
-                self.recording_queue.put(("err", "Speech not understood.", None))
-            except sr.RequestError as e:
-                self.recording_queue.put(("err", f"ASR request error: {e}", None))
+            # get both transcript and show_all for confidence
+            show_all = rec.recognize_google(audio, language="en-US", show_all=True)
+            # Best transcript
+            transcript = ""
+            if isinstance(show_all, dict) and show_all.get("alternative"):
+                transcript = show_all["alternative"][0].get("transcript", "").strip()
+            if not transcript:
+                transcript = rec.recognize_google(audio, language="en-US").strip()
+
+            confidence = compute_confidence_from_google_show_all(show_all)
+
+            return ("ok", transcript, confidence)
+        except sr.UnknownValueError:
+            return ("err", "Speech not understood.", None)
+        except sr.RequestError as e:
+            return ("err", f"ASR request error: {e}", None)
         except Exception as e:
-            self.recording_queue.put(("err", f"Mic/recording error: {e}", None))
+            return ("err", f"Recognition error: {e}", None)
 
     def _poll_recording_queue(self):
         try:
+            # Checked before draining, so events sent just before a crash still apply
+            capture_died = not self.capture.is_alive()
+            event = self.capture.poll_event()
+            while event is not None:
+                if event[0] == "utterance":
+                    self._on_utterance(event[1], event[2])
+                else:
+                    attempt_id, self.listening_attempt = self.listening_attempt, None
+                    self._attempt_done(attempt_id, ("err", event[1], None))
+                event = self.capture.poll_event()
+            if capture_died:
+                self._restart_capture()
             while True:
                 msg = self.recording_queue.get_nowait()
                 kind = msg[0]
-                if kind == "ok":
-                    transcript, confidence = msg[1], msg[2]
-                    self._on_transcription_ready(transcript, confidence)
-                else:
-                    errtxt = msg[1]
-                    self.status_lbl.configure(text=errtxt)
-                    self.record_btn.configure(state="normal")
-                    self.play_btn.configure(state="disabled")
+                if kind == "asr":
+                    self._attempt_done(msg[1], msg[2])
+                elif kind == "tts":
+                    self.status_lbl.configure(text=msg[1])
+                    self.speaking = False
+                    self._update_controls()
+                    self._finish_profile("playback")
         except queue.Empty:
             pass
         finally:
             self.after(100, self._poll_recording_queue)
 
-    def _on_transcription_ready(self, transcript, confidence):
+    def _restart_capture(self):
+        # The child died (e.g. a PortAudio crash): fail the attempt it owed us
+        if self.listening_attempt is not None:
+            attempt_id, self.listening_attempt = self.listening_attempt, None
+            self._attempt_done(attempt_id, ("err", "Mic/recording error: capture process exited.", None))
+        old = self.capture
+        try:
+            self.capture = CaptureProcess(synthetic=self.synthetic)
+        except Exception as e:
+            self.status_lbl.configure(text=f"Could not restart audio capture: {e}")
+            return
+        old.shutdown()
+        self.status_lbl.configure(text=f"{self.status_lbl.cget('text')}  Audio capture restarted.")
+
+    def _poll_level(self):
+        try:
+            self.level_bar.set(self.capture.level())
+            self.overrun_lbl.configure(
+                text=f"Overruns: capture {self.capture.ring.capture_overflows} · buffer {self.capture.reader_overruns}"
+            )
+        finally:
+            self.after(50, self._poll_level)
+
+    def toggle_profile_armed(self, event=None):
+        if self.profiler is not None:
+            return  # a profile is already being taken
+        self.profile_armed = not self.profile_armed
+        self.status_lbl.configure(
+            text="Profiling armed: next attempt will be profiled (F9 to cancel)."
+            if self.profile_armed else "Profiling disarmed."
+        )
+
+    def _maybe_start_profile(self, label, attempt_id=None):
+        if self.profile_armed and self.profiler is None:
+            self.profile_armed = False
+            self.profile_attempt = attempt_id
+            self.profiler = AttemptProfiler(label).start()
+            if label == "record":
+                # Endpointing runs in the capture child; it profiles itself
+                self.capture.profile(f"{label}-capture", self.profiler.stamp, PROFILE_DIR)
+
+    def _finish_profile(self, label, attempt_id=None):
+        if self.profiler is None or self.profiler.label != label or self.profile_attempt != attempt_id:
+            return
+        self.update_idletasks()  # let the final render land inside the profile
+        profiler, self.profiler = self.profiler, None
+        try:
+            path = profiler.stop_and_dump()
+        except OSError as e:
+            self.status_lbl.configure(text=f"Profile not saved: {e}")
+        else:
+            self.status_lbl.configure(
+                text=f"{self.status_lbl.cget('text')}  Profile saved: {path} ({profiler.samples} samples)"
+            )
+
+    def _on_close(self):
+        try:
+            for _ in range(RECOGNIZE_WORKERS):
+                self.recognize_jobs.put(None)
+            self.capture.shutdown()
+            if self.pack is not None:
+                self.pack.close()
+        finally:
+            self.destroy()
+
+    def _on_transcription_ready(self, transcript, confidence, attempt_id, drill_index=None):
         self.transcript = transcript
         self.confidence = confidence
 
-        self._set_transcript_text(transcript)
+        if drill_index is not None and drill_index != self.drill_index:
+            # Recorded against an earlier drill sentence than the one shown
+            self._set_transcript_text(f"[Drill {drill_index + 1}] {transcript}")
+        else:
+            self._set_transcript_text(transcript)
         self._update_confidence(confidence)
-        self._set_ipa_text(safe_ipa(transcript))
-        self._update_rhythm_and_intonation(transcript)
+        if self.drill is None:
+            # In drill mode the right panel keeps showing the target sentence
+            self._set_ipa_text(safe_ipa(transcript))
+            self._update_rhythm_and_intonation(transcript)
 
-        self.status_lbl.configure(text="Transcription complete.")
-        self.record_btn.configure(state="normal")
-        self.play_btn.configure(state="normal" if transcript else "disabled")
+        self.status_lbl.configure(text=f"{self._attempt_label(attempt_id, drill_index)}: transcription complete.")
+        self._update_controls()
+        self._finish_profile("record", attempt_id)
 
     # -------------------------
     # UI Updates
@@ -384,48 +569,16 @@ class PronunciationTrainerApp(ctk.CTk):
         self.rhythm_text.configure(state="disabled")
 
     def _update_rhythm_and_intonation(self, transcript):
-        self.rhythm_text.configure(state="normal")
-        self.rhythm_text.delete("1.0", "end")
-
         if not transcript.strip():
-            self.rhythm_text.insert("1.0", "(no speech)")
-            self.rhythm_text.configure(state="disabled")
+            self._set_rhythm_text("(no speech)")
             return
+        self._set_rhythm_runs(rhythm_runs(transcript))
 
-        sentences = split_into_sentences(transcript)
-        for idx, s in enumerate(sentences):
-            stressed = rhythm_transform(s)
-            yn = is_yes_no_question(s)
-            arrow, arrow_color = mk_arrow_and_color(yn)
-
-            # Insert stressed sentence with simple bold tagging on all CAPS tokens
-            start_idx = self.rhythm_text.index("end-1c")
-
-            # Tokenize to separate words and spaces/punct
-            tokens = re.findall(r"[A-Za-z']+|[^A-Za-z'\s]+|\s+", stressed)
-            for t in tokens:
-                if re.fullmatch(r"[A-Za-z']+", t):
-                    if t.isupper():
-                        self.rhythm_text.insert("end", t, ("bold", "content"))
-                    else:
-                        # function words (lowercase)
-                        self.rhythm_text.insert("end", t, ("function",))
-                else:
-                    self.rhythm_text.insert("end", t)
-
-            # Add space if line doesn't end with punctuation
-            end_char = s.strip()[-1:] if s.strip() else ""
-            if end_char not in ".?!":
-                self.rhythm_text.insert("end", "")
-
-            # Add arrow with color
-            tag = "arrow_rise" if yn else "arrow_fall"
-            self.rhythm_text.insert("end", "  " + arrow, (tag,))
-
-            # Newline between sentences
-            if idx < len(sentences) - 1:
-                self.rhythm_text.insert("end", "\n")
-
+    def _set_rhythm_runs(self, runs):
+        self.rhythm_text.configure(state="normal")
+        self.rhythm_text.delete("1.0", "end")
+        for text, tags in runs:
+            self.rhythm_text.insert("end", text, tags)
         self.rhythm_text.configure(state="disabled")
 
 
@@ -433,5 +586,38 @@ class PronunciationTrainerApp(ctk.CTk):
 # Main
 # -----------------------------
 if __name__ == "__main__":
-    app = PronunciationTrainerApp()
+    parser = argparse.ArgumentParser(description="English Pronunciation Trainer")
+    parser.add_argument("--synthetic", action="store_true",
+                        help="capture a synthetic tone instead of the microphone")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"profile the first attempt into {PROFILE_DIR}/ (F9 re-arms)")
+    parser.add_argument("--lesson-pack", metavar="PACK",
+                        help="drill the sentences of a compiled lesson pack")
+    parser.add_argument("--compile-lesson", metavar="LESSON",
+                        help="compile a lesson file (one sentence per line) into a pack and exit")
+    parser.add_argument("-o", "--output", metavar="PACK",
+                        help="output path for --compile-lesson (default: LESSON with .s2tpack)")
+    parser.add_argument("--no-audio", action="store_true",
+                        help="with --compile-lesson, skip pre-rendering TTS audio")
+    parser.add_argument("--capture-selftest", action="store_true",
+                        help="run the capture process on synthetic audio headlessly and exit")
+    args = parser.parse_args()
+    if args.capture_selftest:
+        raise SystemExit(run_capture_selftest())
+    if args.compile_lesson:
+        out = args.output or os.path.splitext(args.compile_lesson)[0] + ".s2tpack"
+        try:
+            count, rendered = compile_lesson_pack(args.compile_lesson, out, audio=not args.no_audio)
+        except (OSError, ValueError) as e:
+            raise SystemExit(f"Cannot compile lesson: {e}")
+        print(f"Wrote {out}: {count} sentences, {rendered} with pre-rendered audio")
+        raise SystemExit(0)
+    # Open the pack before any window, worker or capture process exists
+    pack = None
+    if args.lesson_pack:
+        try:
+            pack = LessonPack(args.lesson_pack)
+        except (OSError, ValueError) as e:
+            raise SystemExit(f"Cannot open lesson pack: {e}")
+    app = PronunciationTrainerApp(synthetic=args.synthetic, profile=args.profile, lesson_pack=pack)
     app.mainloop()
@@ -6,6 +6,8 @@ import pyttsx3
 import eng_to_ipa as ipa
 import threading
 import re
+import collections
+import queue
 
 # --- Configuration & Constants ---
 ctk.set_appearance_mode("Dark")
@@ -22,6 +24,13 @@ FUNCTION_WORDS = {
     "this", "that", "these", "those"
 }
 
+# Pipelined attempts: utterances captured but not yet shown, and how many
+# may be waiting on Google at once
+MAX_PENDING_ATTEMPTS = 4
+RECOGNIZE_WORKERS = 3
+# Results apply in order, so a stalled request must fail rather than hold the queue
+RECOGNIZE_TIMEOUT = 15  # seconds
+
 YES_NO_STARTERS = {
     "am", "is", "are", "was", "were", "have", "has", "had", "do", "does",
     "did", "can", "could", "will", "would", "shall", "should", "may", "might", "must"
@@ -43,7 +52,17 @@ class PronunciationTrainer(ctk.CTk):
 
         # State variables
         self.is_recording = False
+        self.is_speaking = False
         self.current_transcript = ""
+        # Attempt id -> None while in flight, then its result; applied in order
+        self.next_attempt = 1
+        self.pending = collections.OrderedDict()
+        self.closed = False
+        # Daemon workers, so closing the window never waits on a slow request
+        self.recognize_jobs = queue.Queue()
+        for n in range(RECOGNIZE_WORKERS):
+            threading.Thread(target=self._recognize_worker, name=f"recognize_{n}", daemon=True).start()
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
 
         # --- Init UI Components ---
         self._setup_left_panel()
@@ -131,31 +150,28 @@ class PronunciationTrainer(ctk.CTk):
     # --- Core Logic ---
 
     def toggle_recording(self):
-        if not self.is_recording:
-            self.is_recording = True
-            self.btn_record.configure(text="Listening... (Stop by pausing)", fg_color="#990000", hover_color="#660000")
-            self.status_var.set("Listening (Wait 2.5s after speaking)...")
-            self.btn_playback.configure(state="disabled")
-            # Clear previous data
-            self.txt_transcript.delete("0.0", "end")
-            self.txt_ipa.delete("0.0", "end")
-            self.txt_rhythm.delete("1.0", tk.END)
-            self.progress_acc.set(0)
-            self.lbl_acc_val.configure(text="0%")
-
-            # Start thread
-            threading.Thread(target=self._record_thread, daemon=True).start()
-        else:
-            # Manual stop if needed, though pause_threshold handles it mostly
-            self.is_recording = False
-            self.status_var.set("Stopping...")
-
-    def _record_thread(self):
+        # One capture at a time: the button stays disabled until pause_threshold ends it
+        if not self._can_record():
+            return
+        self.is_recording = True
+        attempt_id = self.next_attempt
+        self.next_attempt += 1
+        self.pending[attempt_id] = None
+        self.btn_record.configure(text="Listening... (Stop by pausing)", fg_color="#990000", hover_color="#660000", state="disabled")
+        self.status_var.set(f"Listening to attempt #{attempt_id} (Wait 2.5s after speaking)...")
+        self.btn_playback.configure(state="disabled")
+        # Previous results stay up until this attempt's results replace them
+
+        # Start thread
+        threading.Thread(target=self._record_thread, args=(attempt_id,), daemon=True).start()
+
+    def _record_thread(self, attempt_id):
         r = sr.Recognizer()
         # Crucial requirement: 2.5 second pause threshold
         r.pause_threshold = 2.5
         r.energy_threshold = 300 # mildly adjust for background noise
         r.dynamic_energy_threshold = True
+        r.operation_timeout = RECOGNIZE_TIMEOUT
 
         try:
             with sr.Microphone() as source:
@@ -163,34 +179,93 @@ class PronunciationTrainer(ctk.CTk):
                 r.adjust_for_ambient_noise(source, duration=1)
                 audio = r.listen(source, timeout=None) # Listen indefinitely until pause
 
-            self.status_var.set("Processing speech...")
-            # Use show_all=True to get raw JSON with confidence alternatives
-            response = r.recognize_google(audio, show_all=True)
-
-            # Schedule UI update on main thread
-            self.after(0, lambda: self._process_results(response))
+            # Capture is done: recognition runs on the pool so the next attempt can start
+            self.after(0, lambda: self._on_captured(attempt_id, r, audio))
 
         except sr.WaitTimeoutError:
-            self.after(0, lambda: self._handle_error("Listening timed out. No speech detected."))
+            self.after(0, lambda: self._on_capture_failed(attempt_id, "Listening timed out. No speech detected."))
+        except Exception as e:
+            msg = f"Error: {e}"
+            self.after(0, lambda: self._on_capture_failed(attempt_id, msg))
+
+    def _on_captured(self, attempt_id, recognizer, audio):
+        self.reset_record_button()
+        self._update_playback_state()
+        in_flight = sum(1 for result in self.pending.values() if result is None)
+        self.status_var.set(f"Processing attempt #{attempt_id} ({in_flight} in flight)...")
+        self.recognize_jobs.put((attempt_id, recognizer, audio))
+
+    def _recognize_worker(self):
+        while True:
+            job = self.recognize_jobs.get()
+            if job is None:
+                return
+            attempt_id, recognizer, audio = job
+            result = self._recognize(recognizer, audio)
+            if self.closed:
+                return
+            # Schedule the in-order apply on the main thread
+            self.after(0, lambda a=attempt_id, r=result: self._attempt_done(a, r))
+
+    def _on_close(self):
+        self.closed = True
+        for _ in range(RECOGNIZE_WORKERS):
+            self.recognize_jobs.put(None)
+        self.destroy()
+
+    def _on_capture_failed(self, attempt_id, msg):
+        self.reset_record_button()
+        self._attempt_done(attempt_id, ("err", msg))
+
+    def _recognize(self, r, audio):
+        try:
+            # Use show_all=True to get raw JSON with confidence alternatives
+            return ("ok", r.recognize_google(audio, show_all=True))
         except sr.RequestError as e:
-            self.after(0, lambda: self._handle_error(f"API Error: {e}"))
+            return ("err", f"API Error: {e}")
         except sr.UnknownValueError:
-            self.after(0, lambda: self._handle_error("Could not understand audio."))
+            return ("err", "Could not understand audio.")
         except Exception as e:
-            self.after(0, lambda: self._handle_error(f"Error: {e}"))
+            return ("err", f"Error: {e}")
+
+    def _attempt_done(self, attempt_id, result):
+        self.pending[attempt_id] = result
+        while self.pending:
+            attempt_id, result = next(iter(self.pending.items()))
+            if result is None:
+                break  # an earlier attempt is still being recognized
+            del self.pending[attempt_id]
+            kind, payload = result
+            if kind == "ok":
+                self._process_results(payload, attempt_id)
+            else:
+                self._handle_error(f"Attempt #{attempt_id}: {payload}")
+        self._update_record_state()
 
     def _handle_error(self, msg):
         self.status_var.set(msg)
-        self.reset_record_button()
+
+    def _can_record(self):
+        # Back-pressure: no new attempt while the pending queue is full
+        return (not self.is_recording
+                and not self.is_speaking
+                and len(self.pending) < MAX_PENDING_ATTEMPTS)
+
+    def _update_record_state(self):
+        self.btn_record.configure(state="normal" if self._can_record() else "disabled")
+
+    def _update_playback_state(self):
+        # Never re-enable playback over a capture or a TTS run still speaking
+        idle = not self.is_recording and not self.is_speaking
+        self.btn_playback.configure(state="normal" if idle and self.current_transcript else "disabled")
 
     def reset_record_button(self):
         self.is_recording = False
         self.btn_record.configure(text="Start Recording", fg_color=ctk.ThemeManager.theme["CTkButton"]["fg_color"], hover_color=ctk.ThemeManager.theme["CTkButton"]["hover_color"])
+        self._update_record_state()
 
-    def _process_results(self, response):
-        self.reset_record_button()
-        self.status_var.set("Analysis Complete")
-        self.btn_playback.configure(state="normal")
+    def _process_results(self, response, attempt_id):
+        self.status_var.set(f"Attempt #{attempt_id}: Analysis Complete")
 
         transcript = ""
         confidence = 0.0
@@ -207,6 +282,8 @@ class PronunciationTrainer(ctk.CTk):
 
             # Update Transcript
         self.current_transcript = transcript
+        self._update_playback_state()
+        self.txt_transcript.delete("0.0", "end")
         self.txt_transcript.insert("0.0", transcript)
 
         # Update Confidence Gauge
@@ -214,6 +291,7 @@ class PronunciationTrainer(ctk.CTk):
 
         # Update IPA
         ipa_text = ipa.convert(transcript)
+        self.txt_ipa.delete("0.0", "end")
         self.txt_ipa.insert("0.0", ipa_text)
 
         # Update Rhythm/Intonation
@@ -275,7 +353,9 @@ class PronunciationTrainer(ctk.CTk):
         if not self.current_transcript: return
 
         # Disable button during playback to prevent spamming
+        self.is_speaking = True
         self.btn_playback.configure(state="disabled", text="Playing...")
+        self._update_record_state()
 
         # Thread audio playback so GUI doesn't freeze
         threading.Thread(target=self._tts_thread, daemon=True).start()
@@ -294,7 +374,13 @@ class PronunciationTrainer(ctk.CTk):
             print(f"TTS Error: {e}")
         finally:
             # Restore button on main thread
-            self.after(0, lambda: self.btn_playback.configure(state="normal", text="Playback Recording"))
+            self.after(0, self._on_tts_done)
+
+    def _on_tts_done(self):
+        self.is_speaking = False
+        self.btn_playback.configure(text="Playback Recording")
+        self._update_playback_state()
+        self._update_record_state()
 
 if __name__ == "__main__":
     try:
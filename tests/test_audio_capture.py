@@ -0,0 +1,158 @@
+import sys
+import time
+
+import pytest
+
+from audio_capture import (
+    CAPTURE_RATE,
+    CAPTURE_WIDTH,
+    CaptureProcess,
+    MicrophoneSource,
+    PcmRingBuffer,
+    SyntheticSource,
+    listen_for_utterance,
+    run_capture_selftest,
+    verify_synthetic_utterance,
+)
+
+
+@pytest.fixture
+def ring():
+    r = PcmRingBuffer.create(60 * CAPTURE_RATE * CAPTURE_WIDTH)
+    yield r
+    r.close()
+    r.unlink()
+
+
+def test_ring_read_across_wrap():
+    r = PcmRingBuffer.create(1000)
+    try:
+        for i in range(7):
+            r.write(bytes([i]) * 300)
+        assert r.write_pos == 2100
+        # 1800..2100 starts in the tail of the buffer and wraps to the front
+        assert r.read(1800, 2100) == bytes([6]) * 300
+        assert r.read(1500, 1800) == bytes([5]) * 300
+    finally:
+        r.close()
+        r.unlink()
+
+
+def test_synthetic_source_is_deterministic():
+    a = SyntheticSource(realtime=False).read(4096)
+    b = SyntheticSource(realtime=False).read(4096)
+    assert a == b
+
+
+def test_listen_captures_synthetic_tone(ring):
+    with SyntheticSource(realtime=False) as source:
+        start, end = listen_for_utterance(source, ring, pause_threshold=2.5)
+    assert verify_synthetic_utterance(start, end, ring.read(start, end)) == []
+
+
+def test_verify_rejects_truncated_or_corrupt_utterance(ring):
+    with SyntheticSource(realtime=False) as source:
+        start, end = listen_for_utterance(source, ring, pause_threshold=2.5)
+    pcm = ring.read(start, end)
+    half = start + (end - start) // 2 // CAPTURE_WIDTH * CAPTURE_WIDTH
+    assert verify_synthetic_utterance(start, half, pcm[:half - start])
+    corrupt = bytes(CAPTURE_WIDTH) + pcm[CAPTURE_WIDTH:]
+    assert verify_synthetic_utterance(start, end, corrupt)
+
+
+def test_lapped_reader_counts_overrun():
+    capture = CaptureProcess(synthetic=True, seconds=0.1)
+    try:
+        capacity = capture.ring.capacity
+        capture.ring.write(bytes(100))
+        assert capture.take_pcm(0, 100) == bytes(100)
+        # The writer laps the reader: position 0 is gone
+        capture.ring.write(bytes(capacity))
+        assert capture.ring.read(0, 100) is None
+        assert capture.take_pcm(0, 100) is None
+        assert capture.reader_overruns == 1
+    finally:
+        capture.shutdown()
+
+
+def test_capture_process_selftest():
+    # Real child process on real-time synthetic audio (~4 s)
+    assert run_capture_selftest() == 0
+
+
+class _FakePyAudio:
+    """Just enough of the pyaudio module to drive MicrophoneSource's callback."""
+    paInputOverflow = 0x2
+    paContinue = 0
+
+    def __init__(self):
+        self.stream = None
+
+    def PyAudio(self):
+        return self
+
+    def get_format_from_width(self, width):
+        return width
+
+    def open(self, stream_callback, **kwargs):
+        self.stream = _FakeStream(stream_callback)
+        return self.stream
+
+    def terminate(self):
+        pass
+
+
+class _FakeStream:
+    def __init__(self, callback):
+        self.callback = callback
+
+    def stop_stream(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_microphone_overflow_is_counted_without_dropping_audio(ring, monkeypatch):
+    fake = _FakePyAudio()
+    monkeypatch.setitem(sys.modules, "pyaudio", fake)
+    with MicrophoneSource(ring) as source:
+        chunk_a, chunk_b = b"\x01\x00" * 4, b"\x02\x00" * 4
+        fake.stream.callback(chunk_a, 4, None, 0)
+        fake.stream.callback(chunk_b, 4, None, fake.paInputOverflow)
+        assert source.read(4) == chunk_a
+        assert source.read(4) == chunk_b
+    assert ring.capture_overflows == 1
+
+
+def test_dead_capture_process_is_reported():
+    capture = CaptureProcess(synthetic=True, seconds=0.1)
+    try:
+        assert capture.is_alive()
+        capture.process.kill()
+        capture.process.wait(timeout=5)
+        capture._reader.join(timeout=5)
+        assert not capture.is_alive()
+        # A listen sent to the dead child comes back as an error event
+        capture.listen(2.5)
+        assert capture.poll_event()[0] == "err"
+    finally:
+        capture.shutdown()
+
+
+def test_capture_process_profiles_the_next_listen(tmp_path):
+    capture = CaptureProcess(synthetic=True, seconds=10)
+    try:
+        capture.profile("record-capture", "20260101-000000", tmp_path)
+        capture.listen(0.5)
+        event = None
+        while event is None:
+            assert capture.is_alive()
+            time.sleep(0.05)
+            event = capture.poll_event()
+        assert event[0] == "utterance"
+        # The profile is written before the event is sent
+        path = tmp_path / "profile-20260101-000000-record-capture.collapsed"
+        assert "listen_for_utterance" in path.read_text(encoding="utf-8")
+    finally:
+        capture.shutdown()
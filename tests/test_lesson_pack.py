@@ -0,0 +1,77 @@
+import pytest
+
+from lesson_pack import LessonPack, compile_lesson_pack, read_lesson, rhythm_runs
+
+LESSON = """\
+# Unit 1
+Is it raining?
+
+I want to buy a new car. Do you?
+"""
+
+
+@pytest.fixture
+def lesson(tmp_path):
+    path = tmp_path / "unit1.txt"
+    path.write_text(LESSON, encoding="utf-8")
+    return path
+
+
+def test_read_lesson_skips_blank_and_comment_lines(lesson):
+    assert read_lesson(lesson) == ["Is it raining?", "I want to buy a new car. Do you?"]
+
+
+def test_round_trip(lesson, tmp_path):
+    pack_path = tmp_path / "unit1.s2tpack"
+    assert compile_lesson_pack(lesson, pack_path, audio=False) == (2, 0)
+    pack = LessonPack(pack_path)
+    try:
+        assert len(pack) == 2
+        for i, text in enumerate(read_lesson(lesson)):
+            entry = pack.entry(i)
+            assert entry["text"] == text
+            assert entry["runs"] == rhythm_runs(text)
+            assert entry["audio"] is None
+        assert pack.entry(0)["yes_no"] is True
+    finally:
+        pack.close()
+
+
+@pytest.mark.parametrize("index", [-1, 2])
+def test_entry_out_of_range(lesson, tmp_path, index):
+    pack_path = tmp_path / "unit1.s2tpack"
+    compile_lesson_pack(lesson, pack_path, audio=False)
+    pack = LessonPack(pack_path)
+    try:
+        with pytest.raises(IndexError):
+            pack.entry(index)
+    finally:
+        pack.close()
+
+
+def test_empty_lesson_is_rejected(tmp_path):
+    path = tmp_path / "empty.txt"
+    path.write_text("# nothing yet\n\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        compile_lesson_pack(path, tmp_path / "empty.s2tpack", audio=False)
+    assert not (tmp_path / "empty.s2tpack").exists()
+
+
+def test_wrong_magic_is_rejected(lesson, tmp_path):
+    pack_path = tmp_path / "unit1.s2tpack"
+    compile_lesson_pack(lesson, pack_path, audio=False)
+    data = bytearray(pack_path.read_bytes())
+    data[:8] = b"NOTAPACK"
+    pack_path.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        LessonPack(pack_path)
+
+
+@pytest.mark.parametrize("keep", [0, 10, -1])
+def test_empty_or_truncated_file_is_rejected(lesson, tmp_path, keep):
+    pack_path = tmp_path / "unit1.s2tpack"
+    compile_lesson_pack(lesson, pack_path, audio=False)
+    data = pack_path.read_bytes()
+    pack_path.write_bytes(data[:keep])
+    with pytest.raises(ValueError):
+        LessonPack(pack_path)